@@ -1,16 +1,36 @@
-from enum import Enum, auto
 from typing import Iterator, Union
 from errors import Error
 from statp import Stat, StatType
 
-class Action(Enum):
-    """Action based on CLI arguments."""
+class Action:
+    """
+    Action based on CLI arguments. The actions are plain int constants
+    instead of enum, it is checked only once so enum is not needed.
+    """
 
-    HELP = auto()
-    PARSE = auto()
-    ERR = auto()
+    HELP = 0
+    PARSE = 1
+    ERR = 2
+
+# arguments that show help
+_HELP = frozenset(["-h", "-?", "--help"])
+
+# arguments that only add the given stat
+_SIMPLE_STATS = {
+    "--loc": StatType.LOC,
+    "--comments": StatType.COMMENTS,
+    "--labels": StatType.LABELS,
+    "--jumps": StatType.JUMPS,
+    "--fwjumps": StatType.FWJUMPS,
+    "--backjumps": StatType.BACKJUMPS,
+    "--badjumps": StatType.BADJUMPS,
+    "--frequent": StatType.FREQUENT,
+    "--eol": StatType.EOL,
+}
 
 class StatFile:
+    __slots__ = ("filename", "stats")
+
     def __init__(self, filename: str) -> None:
         self.filename = filename
         self.stats: list[Stat] = []
@@ -18,11 +38,23 @@ class StatFile:
 class Args:
     """CLI parser"""
 
+    __slots__ = (
+        "action",
+        "err_code",
+        "err_msg",
+        "stats",
+        "_stat_filenames",
+        "cur",
+        "args",
+    )
+
     def __init__(self, args: Iterator[str]) -> None:
         self.action = Action.PARSE
         self.err_code = Error.NONE
         self.err_msg = ""
         self.stats: list[StatFile] = []
+        # names of the files in `stats`, to check for duplicates
+        self._stat_filenames: set[str] = set()
         self.cur: Union[str, None] = None
         self.args = args
 
@@ -34,38 +66,22 @@ class Args:
 
         self._next()
         while self.cur is not None:
-            match self.cur:
-                case "-h" | "-?" | "--help":
-                    if self.action != Action.PARSE:
-                        return self._error("Cannot set action multiple times")
-                    self.action = Action.HELP
-                case "--loc":
-                    self._add_stat(Stat(StatType.LOC))
-                case "--comments":
-                    self._add_stat(Stat(StatType.COMMENTS))
-                case "--labels":
-                    self._add_stat(Stat(StatType.LABELS))
-                case "--jumps":
-                    self._add_stat(Stat(StatType.JUMPS))
-                case "--fwjumps":
-                    self._add_stat(Stat(StatType.FWJUMPS))
-                case "--backjumps":
-                    self._add_stat(Stat(StatType.BACKJUMPS))
-                case "--badjumps":
-                    self._add_stat(Stat(StatType.BADJUMPS))
-                case "--frequent":
-                    self._add_stat(Stat(StatType.FREQUENT))
-                case "--eol":
-                    self._add_stat(Stat(StatType.EOL))
-                case _:
-                    if self.cur.startswith("--stats="):
-                        spl = self.cur.split("=", 1)
-                        self._add_stats(spl[1])
-                    elif self.cur.startswith("--print="):
-                        spl = self.cur.split("=", 1)
-                        self._add_stat(Stat(StatType.PRINT, spl[1]))
-                    else:
-                        return self._error(f"Unknown argument '{self.cur}'")
+            stat = _SIMPLE_STATS.get(self.cur)
+            if stat is not None:
+                self._add_stat(Stat(stat))
+            elif self.cur in _HELP:
+                if self.action != Action.PARSE:
+                    return self._error("Cannot set action multiple times")
+                self.action = Action.HELP
+            else:
+                # arguments with value in the form `--name=value`
+                name, eq, value = self.cur.partition("=")
+                if eq and name == "--stats":
+                    self._add_stats(value)
+                elif eq and name == "--print":
+                    self._add_stat(Stat(StatType.PRINT, value))
+                else:
+                    return self._error(f"Unknown argument '{self.cur}'")
             self._next()
 
     def _add_stat(self, stat: Stat) -> None:
@@ -77,13 +93,13 @@ class Args:
 
     def _add_stats(self, filename: str) -> None:
         # check if the file is unique
-        for s in self.stats:
-            if s.filename == filename:
-                self._error(
-                    f"Cannot output twice to the same file '{filename}'",
-                    Error.FILE_WRITE
-                )
-                return
+        if filename in self._stat_filenames:
+            self._error(
+                f"Cannot output twice to the same file '{filename}'",
+                Error.FILE_WRITE
+            )
+            return
+        self._stat_filenames.add(filename)
         self.stats.append(StatFile(filename))
 
     def _next(self) -> Union[str, None]:
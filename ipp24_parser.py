@@ -1,239 +1,331 @@
-from typing import TextIO, Union
+import sys
+from typing import Callable, Iterator, Union
 from lexer import Lexer, Token, TokenType
 from errors import Error
 
+# Token types used in the hot paths of the parser. Looking up a member of
+# enum class is relatively slow, so the members are cached here.
+_T_EOF = TokenType.EOF
+_T_ERR = TokenType.ERR
+_T_LABEL = TokenType.LABEL
+_T_TYPE = TokenType.TYPE
+
 # definitions to check the validity of instructions. This doesn't check the
 # types of literals but it checks that the general token type is correct
 
 # variable
-_VAR = [TokenType.IDENT]
+_VAR = frozenset([TokenType.IDENT])
 # any symbol with value
-_SYMB = [
+_SYMB = frozenset([
     TokenType.IDENT,
     TokenType.NIL,
     TokenType.BOOL,
     TokenType.INT,
     TokenType.STRING
-]
+])
 # label
-_LABEL = [TokenType.LABEL]
+_LABEL = frozenset([TokenType.LABEL])
 # type, this will match LABEL but it will be converted to TYPE
-_TYPE = [TokenType.TYPE]
+_TYPE = frozenset([TokenType.TYPE])
+# values of LABEL that can be converted to TYPE
+_TYPE_LITERALS = frozenset(["nil", "bool", "int", "string"])
 
 # define how the instructions should be used
 _INSTRUCTIONS = {
-    "MOVE": [_VAR, _SYMB],
-    "CREATEFRAME": [],
-    "PUSHFRAME": [],
-    "POPFRAME": [],
-    "DEFVAR": [_VAR],
-    "CALL": [_LABEL],
-    "RETURN": [],
-    "PUSHS": [_SYMB],
-    "POPS": [_VAR],
-    "ADD": [_VAR, _SYMB, _SYMB],
-    "SUB": [_VAR, _SYMB, _SYMB],
-    "MUL": [_VAR, _SYMB, _SYMB],
-    "IDIV": [_VAR, _SYMB, _SYMB],
-    "LT": [_VAR, _SYMB, _SYMB],
-    "GT": [_VAR, _SYMB, _SYMB],
-    "EQ": [_VAR, _SYMB, _SYMB],
-    "AND": [_VAR, _SYMB, _SYMB],
-    "OR": [_VAR, _SYMB, _SYMB],
-    "NOT": [_VAR, _SYMB],
-    "INT2CHAR": [_VAR, _SYMB],
-    "STRI2INT": [_VAR, _SYMB, _SYMB],
-    "READ": [_VAR, _TYPE],
-    "WRITE": [_SYMB],
-    "CONCAT": [_VAR, _SYMB, _SYMB],
-    "STRLEN": [_VAR, _SYMB],
-    "GETCHAR": [_VAR, _SYMB, _SYMB],
-    "SETCHAR": [_VAR, _SYMB, _SYMB],
-    "TYPE": [_VAR, _SYMB],
-    "LABEL": [_LABEL],
-    "JUMP": [_LABEL],
-    "JUMPIFEQ": [_LABEL, _SYMB, _SYMB],
-    "JUMPIFNEQ": [_LABEL, _SYMB, _SYMB],
-    "EXIT": [_SYMB],
-    "DPRINT": [_SYMB],
-    "BREAK": [],
+    "MOVE": (_VAR, _SYMB),
+    "CREATEFRAME": (),
+    "PUSHFRAME": (),
+    "POPFRAME": (),
+    "DEFVAR": (_VAR,),
+    "CALL": (_LABEL,),
+    "RETURN": (),
+    "PUSHS": (_SYMB,),
+    "POPS": (_VAR,),
+    "ADD": (_VAR, _SYMB, _SYMB),
+    "SUB": (_VAR, _SYMB, _SYMB),
+    "MUL": (_VAR, _SYMB, _SYMB),
+    "IDIV": (_VAR, _SYMB, _SYMB),
+    "LT": (_VAR, _SYMB, _SYMB),
+    "GT": (_VAR, _SYMB, _SYMB),
+    "EQ": (_VAR, _SYMB, _SYMB),
+    "AND": (_VAR, _SYMB, _SYMB),
+    "OR": (_VAR, _SYMB, _SYMB),
+    "NOT": (_VAR, _SYMB),
+    "INT2CHAR": (_VAR, _SYMB),
+    "STRI2INT": (_VAR, _SYMB, _SYMB),
+    "READ": (_VAR, _TYPE),
+    "WRITE": (_SYMB,),
+    "CONCAT": (_VAR, _SYMB, _SYMB),
+    "STRLEN": (_VAR, _SYMB),
+    "GETCHAR": (_VAR, _SYMB, _SYMB),
+    "SETCHAR": (_VAR, _SYMB, _SYMB),
+    "TYPE": (_VAR, _SYMB),
+    "LABEL": (_LABEL,),
+    "JUMP": (_LABEL,),
+    "JUMPIFEQ": (_LABEL, _SYMB, _SYMB),
+    "JUMPIFNEQ": (_LABEL, _SYMB, _SYMB),
+    "EXIT": (_SYMB,),
+    "DPRINT": (_SYMB,),
+    "BREAK": (),
+}
+
+# maps opcodes as written in the code to the upper case opcodes. Mixed case
+# opcodes are added when they are first seen, so that `upper` is called only
+# once for each spelling.
+_OPCODES = {op: op for op in _INSTRUCTIONS}
+
+# names of the argument types in the xml output
+_TYPE_STR = {
+    TokenType.LABEL: "label",
+    TokenType.IDENT: "var",
+    TokenType.NIL: "nil",
+    TokenType.BOOL: "bool",
+    TokenType.INT: "int",
+    TokenType.STRING: "string",
+    TokenType.TYPE: "type",
+}
+
+# the argument xml elements differ only in the position, type and value, so
+# the tags are prepared for each position (and type) in advance
+_ARG_ORDERS = range(1, max(map(len, _INSTRUCTIONS.values())) + 1)
+# opening tags by position and type
+_ARG_OPEN = {
+    o: {t: f'        <arg{o} type="{s}">' for (t, s) in _TYPE_STR.items()}
+    for o in _ARG_ORDERS
 }
+# closing tags by position
+_ARG_CLOSE = {o: f'</arg{o}>\n' for o in _ARG_ORDERS}
 
 class Arg:
     """Represents argument to a instruction, it is subset of Token."""
 
+    __slots__ = ("type", "value")
+
     def __init__(self, token: Token) -> None:
-        # check that the token as valid type. Throw if the type is incorrect
-        # because that should never happen and it is a bug.
+        # the token type is not checked here, the parser checks it against
+        # the expected arguments of the instruction
         self.type = token.type
         self.value = token.value
 
-    def write_xml(self, order: int, out: TextIO):
-        # convert argument to xml element
-
-        # the type needs tobe converted to string
-        type_s = ""
-        match self.type:
-            case TokenType.LABEL:
-                type_s = "label"
-            case TokenType.IDENT:
-                type_s = "var"
-            case TokenType.NIL:
-                type_s = "nil"
-            case TokenType.BOOL:
-                type_s = "bool"
-            case TokenType.INT:
-                type_s = "int"
-            case TokenType.STRING:
-                type_s = "string"
-            case TokenType.TYPE:
-                type_s = "type"
-            case _:
-                raise ValueError("Invalid argumen type 'self.type'")
-
-        # write the element
-        out.write(
-            f'        <arg{order} type="{type_s}">{self.value}</arg{order}>\n'
-        )
+    def to_xml(self, order: int) -> str:
+        """Converts the argument to xml element"""
 
-class Instruction:
-    """Represents IPPcode24 instruction, that is its opcode and arguments"""
+        # the opening tag is prepared for each position and type
+        open_tag = _ARG_OPEN[order].get(self.type)
+        if open_tag is None:
+            raise ValueError(f"Invalid argument type '{self.type}'")
 
-    def __init__(self, name: str, args: list[Arg]) -> None:
-        self.opcode = name.upper()
-        self.args = args
+        # the value is escaped only here, the tokens contain the raw value.
+        # Most values contain nothing to escape, checking that is cheaper than
+        # the replacing. Chained `replace` is faster than `str.translate` with
+        # multi character replacements for the short strings in IPPcode24.
+        value = self.value
+        if "&" in value or "<" in value or ">" in value:
+            value = value \
+                .replace("&", "&amp;") \
+                .replace("<", "&lt;") \
+                .replace(">", "&gt;")
 
-    def validate(self) -> Union[tuple[Error, str], None]:
-        """
-        Validates the instruction, checks if the opcode is known and if the
-        arguments are correct.
+        return open_tag + value + _ARG_CLOSE[order]
 
-            Returns:
-                `None` if the arguments are correct, tuple of error code and
-                error message if the arguments are incorrect.
-        """
+class Instruction:
+    """Represents IPPcode24 instruction, that is its opcode and arguments"""
 
-        shape = _INSTRUCTIONS.get(self.opcode)
+    __slots__ = ("opcode", "args")
 
-        # check if the opcode is valid
-        if shape is None:
-            return (
-                Error.INVALID_OPCODE,
-                f"Unknown instruction '{self.opcode}'"
-            )
+    def __init__(self, opcode: str, args: list[Arg]) -> None:
+        # the opcode is expected to be already validated and in upper case
+        self.opcode = opcode
+        self.args = args
 
-        # check if the number of arguments is correct
-        if len(shape) != len(self.args):
-            return (
-                Error.PARSE,
-                f"Invalid number of arguments for instruction '{self.opcode}'"
-            )
+    def to_xml(self, order: int) -> str:
+        """Converts the instruction with its arguments to xml element"""
 
-        # check if type of each of the arguments matches
-        for (have, expect) in zip(self.args, shape):
-            # convert LABEL to TYPE when appropriate. It is expected that if
-            # argument can be type, the type is the first of the possible
-            # values
-            if expect[0] == TokenType.TYPE \
-                and have.type == TokenType.LABEL \
-                and have.value in ["nil", "bool", "int", "string"]:
-                have.type = TokenType.TYPE
-                continue
-            if have.type not in expect:
-                return (
-                    Error.PARSE,
-                    f"Invalid arguments to '{self.opcode}'",
-                )
-
-        return None
-
-    def write_xml(self, order: int, out: TextIO):
         # start the instruction tag
-        out.write(
+        parts = [
             f'    <instruction order="{order}" opcode="{self.opcode}">\n'
-        )
+        ]
 
-        # write the arguments
+        # add the arguments
         for (idx, arg) in enumerate(self.args):
-            arg.write_xml(idx + 1, out)
+            parts.append(arg.to_xml(idx + 1))
 
         # end the instruction tag
-        out.write('    </instruction>\n')
+        parts.append('    </instruction>\n')
+        return "".join(parts)
+
+def _to_type(arg: Arg, expect: frozenset[TokenType]) -> bool:
+    """
+    Converts LABEL argument to TYPE if it is expected and it is valid type
+    name.
+
+        Returns:
+            `True` if the argument was converted, otherwise `False`.
+    """
+
+    if expect is _TYPE \
+        and arg.type == _T_LABEL \
+        and arg.value in _TYPE_LITERALS:
+        arg.type = _T_TYPE
+        return True
+    return False
+
+def _make_reader(
+    shape: tuple[frozenset[TokenType], ...]
+) -> Callable[[list[Token]], Union[list[Arg], None]]:
+    """
+    Creates function that reads arguments of instruction with the given
+    shape. The function gets all the tokens of the instruction (including the
+    opcode) and returns the arguments or `None` if type of any of the
+    arguments is invalid. The checks are unrolled for each number of
+    arguments so that there is no generic loop for each instruction.
+    """
+
+    match shape:
+        case ():
+            return lambda toks: []
+        case (e1,):
+            def read1(toks: list[Token]) -> Union[list[Arg], None]:
+                a1 = Arg(toks[1])
+                if a1.type not in e1 and not _to_type(a1, e1):
+                    return None
+                return [a1]
+            return read1
+        case (e1, e2):
+            def read2(toks: list[Token]) -> Union[list[Arg], None]:
+                a1 = Arg(toks[1])
+                if a1.type not in e1 and not _to_type(a1, e1):
+                    return None
+                a2 = Arg(toks[2])
+                if a2.type not in e2 and not _to_type(a2, e2):
+                    return None
+                return [a1, a2]
+            return read2
+        case (e1, e2, e3):
+            def read3(toks: list[Token]) -> Union[list[Arg], None]:
+                a1 = Arg(toks[1])
+                if a1.type not in e1 and not _to_type(a1, e1):
+                    return None
+                a2 = Arg(toks[2])
+                if a2.type not in e2 and not _to_type(a2, e2):
+                    return None
+                a3 = Arg(toks[3])
+                if a3.type not in e3 and not _to_type(a3, e3):
+                    return None
+                return [a1, a2, a3]
+            return read3
+    raise ValueError(f"Unsupported number of arguments {len(shape)}")
+
+# number of arguments and function that reads them for each instruction
+_READERS = {
+    op: (len(shape), _make_reader(shape))
+    for (op, shape) in _INSTRUCTIONS.items()
+}
 
 class Parser:
     def __init__(self, lexer: Lexer) -> None:
         self.lexer = lexer
+        # reads the tokens of the next line from the lexer
+        self._next_line = iter(lexer).__next__
         # current token
-        self.cur = []
+        self.cur: list[Token] = []
         # first error code
         self.err_code = Error.NONE
         # first error message
         self.err_msg = ""
 
     def parse(self) -> list[Instruction]:
-        self._next_tok();
+        """
+        Parses all the instructions. Returns empty list if there was an
+        error.
+        """
 
-        if self.cur[0].type != TokenType.DIRECTIVE or self.cur[0].value != ".IPPcode24":
-            self._error("Invalid code header", Error.INVALID_HEADER)
+        res = list(self.stream())
+        if self.err_code != Error.NONE:
             return []
+        return res
+
+    def stream(self) -> Iterator[Instruction]:
+        """
+        Yields the instructions as they are parsed, so that they don't have to
+        be all in memory at once. If there is an error, the iteration stops
+        and the error is in `err_code` and `err_msg`.
+        """
+
+        typ = self._next_tok()
+
+        if typ != TokenType.DIRECTIVE or self.cur[0].value != ".IPPcode24":
+            self._error("Invalid code header", Error.INVALID_HEADER)
+            return
 
         if len(self.cur) != 1:
             self._error("Expected newline after code header")
-            return []
+            return
 
-        self.cur = self._next_tok()
-        res: list[Instruction] = []
+        typ = self._next_tok()
 
-        # read all the instructions
-        while self.cur[0].type != TokenType.EOF and self.err_code == Error.NONE:
-            i = self._parse_instruction()
-            if not i:
-                return []
-            res.append(i)
-            self._next_tok()
+        # bound methods used in the loop are cached to avoid looking them up
+        # for each instruction
+        parse_instruction = self._parse_instruction
+        next_tok = self._next_tok
 
-        return res
+        # read all the instructions, errors in instructions return directly
+        # so the only other error may come from the lexer
+        while typ != _T_EOF and typ != _T_ERR:
+            i = parse_instruction()
+            if not i:
+                return
+            yield i
+            typ = next_tok()
 
     def _parse_instruction(self) -> Union[Instruction, None]:
-        inst = self.cur[0]
+        toks = self.cur
+        inst = toks[0]
         # check correct token for opcode
-        if inst.type != TokenType.LABEL:
+        if inst.type != _T_LABEL:
             return self._error("Expected instruction name")
 
-        args: list[Arg] = []
-
-        for a in self.cur[1:]:
-            arg = Parser._new_arg(a)
-            if arg is None:
-                return self._error("Invalid argument type")
-            args.append(arg)
-
-        inst = Instruction(inst.value, args)
-        val = inst.validate()
-        if val is not None:
-            return self._error(val[1], val[0])
-        return inst
-
-    @staticmethod
-    def _new_arg(token: Token) -> Union[Arg, None]:
-        match token.type:
-            case TokenType.LABEL \
-                | TokenType.IDENT \
-                | TokenType.NIL \
-                | TokenType.BOOL \
-                | TokenType.INT \
-                | TokenType.STRING \
-                | TokenType.TYPE:
-                return Arg(token)
-            case _:
-                return None
-
-    def _next_tok(self) -> list[Token]:
-        self.cur = self.lexer.next()
+        opcode = _OPCODES.get(inst.value)
+        if opcode is None:
+            opcode = inst.value.upper()
+            if opcode in _INSTRUCTIONS:
+                # intern returns the same string object as the key in
+                # `_INSTRUCTIONS` so all the opcodes share the same objects
+                opcode = sys.intern(opcode)
+                _OPCODES[inst.value] = opcode
+        reader = _READERS.get(opcode)
+
+        # check if the opcode is valid before reading the arguments
+        if reader is None:
+            return self._error(
+                f"Unknown instruction '{opcode}'",
+                Error.INVALID_OPCODE
+            )
+
+        # check if the number of arguments is correct
+        (nargs, read) = reader
+        if nargs != len(toks) - 1:
+            return self._error(
+                f"Invalid number of arguments for instruction '{opcode}'"
+            )
+
+        # read the arguments and check their types
+        args = read(toks)
+        if args is None:
+            return self._error(f"Invalid arguments to '{opcode}'")
+
+        return Instruction(opcode, args)
+
+    def _next_tok(self) -> TokenType:
+        """Reads the next line of tokens and returns type of its first token"""
+
+        toks = self._next_line()
+        self.cur = toks
+        typ = toks[0].type
         # Implicitly propagate lexer errors
-        if self.cur[0].type == TokenType.ERR:
-            self._error(self.cur[0].value)
-        return self.cur
+        if typ == _T_ERR:
+            self._error(toks[0].value)
+        return typ
 
     def _error(self, msg: str, code: Error = Error.PARSE) -> None:
         # The first error is the most relevant, ensure that only it is saved.
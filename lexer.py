@@ -1,8 +1,10 @@
-from typing import TextIO
-from enum import Enum, auto
-import re
+from typing import Iterator, TextIO
+from enum import IntEnum, auto
 
-class TokenType(Enum):
+class TokenType(IntEnum):
+    # IntEnum is used because the token types are used as keys in dicts and
+    # sets and the hash of Enum is computed in python, IntEnum uses the fast
+    # hash of int.
     EOF = auto()
     ERR = auto()
     DIRECTIVE = auto()
@@ -16,21 +18,69 @@ class TokenType(Enum):
     STRING = auto()
     TYPE = auto()
 
+# cached member of the enum, used for each token
+_T_ERR = TokenType.ERR
+
 class Token:
     """Contains the token type and string value of the token."""
 
-    def __init__(self, typ: TokenType, value: str = ""):
+    __slots__ = ("type", "value")
+
+    def __init__(self, typ: TokenType, value: str = "") -> None:
         self.type = typ
         self.value = value
 
-# regexes for checking validity of some tokens
-
-# Checks for valid identifiers, labels or instructions
-_IDENT_RE = re.compile(r"[A-Za-z_\-$&%*!?][0-9A-Za-z_\-$&%*!?]*")
-# Checks for valid integer literals
-_INT_RE = re.compile(r"[+\-]?([0-9][0-9_]*|0x[0-9A-Fa-f_]*|0o[0-7_]*)")
-# checks for valid string literals
-_STRING_RE = re.compile(r"([^\\]|\\[0-9][0-9][0-9])*")
+# tokens are never modified, so tokens that always have the same value are
+# created only once
+_EOF = Token(TokenType.EOF)
+_NIL = Token(TokenType.NIL, "nil")
+_TRUE = Token(TokenType.BOOL, "true")
+_FALSE = Token(TokenType.BOOL, "false")
+
+# functions for checking validity of some tokens. They are written by hand
+# because for such simple rules it is faster than running regex. `strip` is
+# used to check that all the characters are from the given set: it removes
+# them from both ends, so nothing remains only if all the characters are
+# from the set.
+
+_DIGITS = "0123456789"
+# characters allowed in identifiers, labels and instructions
+_IDENT_CHARS = \
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ" \
+    + _DIGITS \
+    + "_-$&%*!?"
+# characters allowed in the integer literals in each base
+_DEC_CHARS = _DIGITS + "_"
+_HEX_CHARS = _DIGITS + "abcdefABCDEF_"
+_OCT_CHARS = "01234567_"
+
+def _is_ident(s: str) -> bool:
+    """Checks for valid identifiers, labels or instructions"""
+    return s != "" and s[0] not in _DIGITS and not s.strip(_IDENT_CHARS)
+
+def _is_int(s: str) -> bool:
+    """Checks for valid integer literals"""
+    if s.startswith(("+", "-")):
+        s = s[1:]
+    if s.startswith("0x"):
+        return not s[2:].strip(_HEX_CHARS)
+    if s.startswith("0o"):
+        return not s[2:].strip(_OCT_CHARS)
+    return s != "" and s[0] in _DIGITS and not s.strip(_DEC_CHARS)
+
+def _is_string(s: str) -> bool:
+    """Checks for valid string literals"""
+    # each `\` must start escape sequence with exactly three digits
+    i = s.find("\\")
+    while i != -1:
+        esc = s[i + 1:i + 4]
+        if len(esc) != 3 or esc.strip(_DIGITS):
+            return False
+        i = s.find("\\", i + 4)
+    return True
+
+# frames of variables
+_FRAMES = frozenset(["TF", "LF", "GF"])
 
 class Lexer:
     def __init__(self, input: TextIO) -> None:
@@ -40,129 +90,122 @@ class Lexer:
         # be collected here
         self.comment_count = 0
 
-    def next(self) -> list[Token]:
-        """Gets the next token"""
-
-        n = self._read_next();
-        while not n:
-            n = self._read_next();
-        return n
-
-    def _read_next(self) -> list[Token]:
-        """Reads next line of input and creates it into tokens"""
-
-        # read next line and check for eof
-        line = self.input.readline()
-        if not line:
-            return [Token(TokenType.EOF)]
-
-        queue: list[Token] = []
-
-        for s in line.split():
-            # check for comments
-            spl = s.split('#', maxsplit=1)
-            if spl[0]:
-                t = Lexer._parse_token(spl[0]);
-                if t.type == TokenType.ERR:
-                    return [t]
-                queue.append(t)
-            if len(spl) > 1:
-                self.comment_count += 1;
-                return queue
-
-        return queue
-
-    @staticmethod
-    def _parse_token(s: str) -> Token:
-        # check for special directives (e.g. '.IPPcode24')
-        if s[0] == ".":
-            return Token(TokenType.DIRECTIVE, s)
-
-        # empty string literals are special case where there is nothing after
-        # the `@` symbol
-        if s == "string@":
-            return Token(TokenType.STRING)
-
-        # split by `@`, if there is no `@` it is label, otherwise the first
-        # of the splitted array will determine the token type
-
-        spl = s.split("@")
-        if len(spl) == 1:
-            return Lexer._parse_label(s)
-
-        # string literals can contain `@`
-        if len(spl) > 2:
-            if spl[0] == "string":
-                return Lexer._parse_string("@".join(spl[1:]))
-            return Token(
-                TokenType.ERR,
-                f"unexpected character '@' in '{s}'"
-            )
-
-        type = spl[0]
-        value = spl[1]
-
-        # check for the type of the token
-        match type:
-            case "TF" | "LF" | "GF":
-                return Lexer._parse_ident(s)
-            case "nil":
-                return Lexer._parse_nil(value)
-            case "bool":
-                return Lexer._parse_bool(value)
-            case "int":
-                return Lexer._parse_int(value)
-            case "string":
-                return Lexer._parse_string(value)
-            case _:
-                return Token(
-                    TokenType.ERR,
-                    f"Unknown data type '{type}'"
-                )
-
-    @staticmethod
-    def _parse_label(s: str) -> Token:
-        if _IDENT_RE.fullmatch(s):
-            return Token(TokenType.LABEL, s.replace("&", "&amp;"))
-        return Token(TokenType.ERR, f"Invalid label name '{s}'")
-
-    @staticmethod
-    def _parse_ident(s: str) -> Token:
-        # `s` also contains the frame, run the checks only on the name
-        id = s[3:]
-        if _IDENT_RE.fullmatch(id):
-            return Token(TokenType.IDENT, s.replace("&", "&amp;"))
-        return Token(TokenType.ERR, f"Invalid variable name '{s}'")
-
-    @staticmethod
-    def _parse_nil(s: str) -> Token:
-        if s == "nil":
-            return Token(TokenType.NIL, "nil")
-        return Token(TokenType.ERR, "type 'nil' can only have value 'nil'")
-
-    @staticmethod
-    def _parse_bool(s: str) -> Token:
-        match s:
-            case "true":
-                return Token(TokenType.BOOL, "true")
-            case "false":
-                return Token(TokenType.BOOL, "false")
-            case _:
-                return Token(TokenType.ERR, f"Invalid bool value '{s}'")
-
-    @staticmethod
-    def _parse_int(s: str) -> Token:
-        if _INT_RE.fullmatch(s):
-            return Token(TokenType.INT, s)
-        return Token(TokenType.ERR, f"Invalid int value '{s}'")
-
-    @staticmethod
-    def _parse_string(s: str) -> Token:
-        if _STRING_RE.fullmatch(s):
-            return Token(
-                TokenType.STRING,
-                s.replace("&", "&amp;")
-                    .replace("<", "&lt;")
-                    .replace(">", "&gt;")
-            )
-        return Token(TokenType.ERR, f"Invalid string value '{s}'")
+    def __iter__(self) -> Iterator[list[Token]]:
+        """
+        Yields the tokens of each line that contains any tokens. Line with
+        error yields only the error token. After the end of the input,
+        EOF is yielded indefinitely.
+        """
+
+        # The whole input is read at once, IPPcode24 programs are small and it
+        # is faster than reading it line by line. It is split only on `\n`
+        # (`splitlines` would split also on other characters).
+        lines = self.input.read().split("\n")
+
+        # lines without tokens are skipped here, so that the parser doesn't
+        # have to loop over them
+        for line in lines:
+            queue: list[Token] = []
+
+            for s in line.split():
+                # check for comments, `find` doesn't allocate like `split`
+                comment = s.find("#")
+                if comment != -1:
+                    s = s[:comment]
+                if s:
+                    t = _parse_token(s)
+                    if t.type == _T_ERR:
+                        queue = [t]
+                        break
+                    queue.append(t)
+                if comment != -1:
+                    self.comment_count += 1
+                    break
+
+            if queue:
+                yield queue
+
+        while True:
+            yield [_EOF]
+
+# functions that parse the individual tokens. They are module level functions
+# and not static methods so that calling them is only a global lookup.
+
+def _parse_token(s: str) -> Token:
+    # check for special directives (e.g. '.IPPcode24')
+    if s[0] == ".":
+        return Token(TokenType.DIRECTIVE, s)
+
+    # find the first `@`, if there is no `@` it is label, otherwise the
+    # part before it will determine the token type. The `@` is found
+    # with `find` so that no list is allocated for each token.
+    at = s.find("@")
+    if at == -1:
+        return _parse_label(s)
+
+    type = s[:at]
+    value = s[at + 1:]
+
+    # only string literals can contain another `@`
+    if type != "string" and "@" in value:
+        return Token(
+            TokenType.ERR,
+            f"unexpected character '@' in '{s}'"
+        )
+
+    # check for the type of the token, variables are whole checked
+    if type in _FRAMES:
+        return _parse_ident(s)
+
+    parse = _LITERALS.get(type)
+    if parse is None:
+        return Token(
+            TokenType.ERR,
+            f"Unknown data type '{type}'"
+        )
+    return parse(value)
+
+def _parse_label(s: str) -> Token:
+    if _is_ident(s):
+        return Token(TokenType.LABEL, s)
+    return Token(TokenType.ERR, f"Invalid label name '{s}'")
+
+def _parse_ident(s: str) -> Token:
+    # `s` also contains the frame, run the checks only on the name
+    id = s[3:]
+    if _is_ident(id):
+        return Token(TokenType.IDENT, s)
+    return Token(TokenType.ERR, f"Invalid variable name '{s}'")
+
+def _parse_nil(s: str) -> Token:
+    if s == "nil":
+        return _NIL
+    return Token(TokenType.ERR, "type 'nil' can only have value 'nil'")
+
+def _parse_bool(s: str) -> Token:
+    match s:
+        case "true":
+            return _TRUE
+        case "false":
+            return _FALSE
+        case _:
+            return Token(TokenType.ERR, f"Invalid bool value '{s}'")
+
+def _parse_int(s: str) -> Token:
+    if _is_int(s):
+        return Token(TokenType.INT, s)
+    return Token(TokenType.ERR, f"Invalid int value '{s}'")
+
+def _parse_string(s: str) -> Token:
+    if _is_string(s):
+        return Token(TokenType.STRING, s)
+    return Token(TokenType.ERR, f"Invalid string value '{s}'")
+
+# functions that parse the value of literal based on its type, this is a
+# single dict lookup instead of comparing the type with each of the names
+_LITERALS = {
+    "nil": _parse_nil,
+    "bool": _parse_bool,
+    "int": _parse_int,
+    "string": _parse_string,
+}
@@ -1,25 +1,35 @@
 #!/usr/bin/python3
 
 import sys
-from typing import TextIO
+from typing import Iterable, TextIO
 from lexer import Lexer
 from ipp24_parser import Instruction, Parser
 from errors import Error
 from args import Action, Args, parse_args
-from statp import Stats
+from statp import Stats, needs_examine
+
+# the xml header with the opening program tag and the closing program tag,
+# they are the same for each document
+_XML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode24">
+"""
+_XML_FOOTER = '</program>\n'
+
+# buffer size for the stats files, larger than the default 8 KiB
+_STATS_BUFFER_SIZE = 1 << 17
 
 def main(argv: list[str]) -> Error:
     args = parse_args(argv)
-    match args.action:
-        case Action.PARSE:
-            return parse(args, sys.stdin)
-            # return parse(args, open("testfile.IPPcode24", encoding = "utf-8"))
-        case Action.HELP:
-            print_help()
-            return Error.NONE
-        case Action.ERR:
-            print("error:", args.err_msg, file = sys.stderr)
-            return args.err_code
+    action = args.action
+    if action == Action.PARSE:
+        return parse(args, sys.stdin)
+        # return parse(args, open("testfile.IPPcode24", encoding = "utf-8"))
+    elif action == Action.HELP:
+        print_help()
+        return Error.NONE
+    elif action == Action.ERR:
+        print("error:", args.err_msg, file = sys.stderr)
+        return args.err_code
     return Error.NONE
 
 def parse(
@@ -32,21 +42,36 @@ def parse(
     # parse the input
     lexer = Lexer(input)
     parser = Parser(lexer)
-    insts = parser.parse()
 
-    # check for errors while parsing
+    # The instructions are parsed, converted to xml and examined for stats in
+    # single pass, so they are never all in memory at once. The instructions
+    # are examined only if some of the stats needs it, otherwise they are
+    # only counted.
+    insts = parser.stream()
+    stats = None
+    if args.stats:
+        stats = Stats(lexer)
+        if any(needs_examine(s.stats) for s in args.stats):
+            insts = stats.examine(insts)
+        else:
+            insts = stats.count(insts)
+    xml = make_xml(insts)
+
+    # check for errors while parsing, nothing is written if there is error
     if parser.err_code != Error.NONE:
         print("error:", parser.err_msg, file = sys.stderr)
         return parser.err_code
 
-    # generate xml into output
-    make_xml(insts, output)
+    # write the xml into output
+    write_output(xml, output)
 
     # print the stats
-    stats = Stats(insts, lexer)
+    if stats is None:
+        return Error.NONE
+
     for s in args.stats:
         try:
-            f = open(s.filename, "w")
+            f = open(s.filename, "w", buffering = _STATS_BUFFER_SIZE)
         except Exception as e:
             print("error: failed to open file:", e, file = sys.stderr)
             return Error.FILE_WRITE
@@ -56,27 +81,42 @@ def parse(
 
     return Error.NONE
 
-def make_xml(insts: list[Instruction], out: TextIO):
-    """Serializes the instructions into a xml output"""
+def make_xml(insts: Iterable[Instruction]) -> str:
+    """Serializes the instructions into a xml document"""
 
     # The xml serialization is very simple and in this case using library to do
     # it wouldn't be much simpler
 
+    # The whole document is built as a single string, so that it can be
+    # written at once instead of many small writes.
+
     # the xml header and program tag
-    out.write(
-        """<?xml version="1.0" encoding="UTF-8"?>
-<program language="IPPcode24">
-"""
-    )
+    parts = [_XML_HEADER]
 
-    # write instrucitons
-    for (idx, inst) in enumerate(insts):
-        inst.write_xml(idx + 1, out)
+    # the instructions
+    append = parts.append
+    for (idx, inst) in enumerate(insts, 1):
+        append(inst.to_xml(idx))
 
     # close the program tag
-    out.write('</program>\n')
+    append(_XML_FOOTER)
+
+    return "".join(parts)
+
+def write_output(xml: str, out: TextIO) -> None:
+    """Writes the xml document into `out`"""
+
+    # The xml is written as UTF-8 bytes directly into the binary buffer of
+    # `out`, so that the text layer doesn't have to process it.
+    raw = getattr(out, "buffer", None)
+    if raw is None:
+        out.write(xml)
+    else:
+        out.flush()
+        raw.write(xml.encode("utf-8"))
+        raw.flush()
 
-def print_help():
+def print_help() -> None:
     """Prints help to stdout."""
 
     print(
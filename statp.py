@@ -1,9 +1,11 @@
-from enum import Enum, auto
-from typing import TextIO
+from enum import IntEnum, auto
+from typing import Callable, Iterable, Iterator, TextIO
 from ipp24_parser import Instruction
 from lexer import Lexer
 
-class StatType(Enum):
+class StatType(IntEnum):
+    # IntEnum is used because the stat types are keys in the dispatch table,
+    # IntEnum has the fast hash and comparison of int.
     # Number of instructions
     LOC = auto()
     # Number of comments
@@ -25,68 +27,119 @@ class StatType(Enum):
     # print newline
     EOL = auto()
 
+# categories of instructions that are relevant for the stats
+_CAT_LABEL = 1
+# jump where the direction can be determined
+_CAT_JUMP = 2
+# return is also jump, but the direction is not defined
+_CAT_RETURN = 3
+
+# category of each instruction, instructions that are not here don't affect
+# any stats except the frequency
+_CAT = {
+    "LABEL": _CAT_LABEL,
+    "CALL": _CAT_JUMP,
+    "JUMP": _CAT_JUMP,
+    "JUMPIFEQ": _CAT_JUMP,
+    "JUMPIFNEQ": _CAT_JUMP,
+    "RETURN": _CAT_RETURN,
+}
+
+# stats that need the examination of the instructions (not only their count)
+_EXAMINED = frozenset([
+    StatType.LABELS,
+    StatType.JUMPS,
+    StatType.FWJUMPS,
+    StatType.BACKJUMPS,
+    StatType.BADJUMPS,
+    StatType.FREQUENT,
+])
+
+def needs_examine(stats: Iterable["Stat"]) -> bool:
+    """Checks whether any of the stats needs `Stats.examine`"""
+    return any(s.type in _EXAMINED for s in stats)
+
 class Stat:
     def __init__(self, typ: StatType, value: str = "") -> None:
         self.type = typ
         self.value = value
+        # the value as printed by PRINT, prepared only once
+        self.rendered = value + "\n"
 
 class Stats:
-    def __init__(self, insts: list[Instruction], lexer: Lexer) -> None:
-        self.insts = insts
-        self.loc = str(len(insts)) + "\n"
-        # comments were already ignored, we must ask the lexer about them
-        self.comments = str(lexer.comment_count) + "\n"
-        # true if the stats are calculated
-        self.examined = False
+    def __init__(self, lexer: Lexer) -> None:
+        # comments are ignored with tokenization, we must ask the lexer about
+        # them
+        self.lexer = lexer
+        self.loc = ""
+        self.comments = ""
         self.labels = ""
         self.jumps = ""
         self.fwjumps = ""
         self.backjumps = ""
         self.badjumps = ""
         self.frequent = ""
+        # true when the instructions were counted (by `count` or `examine`)
+        self.counted = False
+        # true when the instructions were examined by `examine`
+        self.examined = False
+        # functions that get the value of each stat, this is a single dict
+        # lookup for each printed stat
+        self._dispatch: dict[StatType, Callable[[Stat], str]] = {
+            StatType.LOC: lambda s: self.loc,
+            StatType.COMMENTS: lambda s: self.comments,
+            StatType.PRINT: lambda s: s.rendered,
+            StatType.EOL: lambda s: "\n",
+            StatType.LABELS: lambda s: self.labels,
+            StatType.JUMPS: lambda s: self.jumps,
+            StatType.FWJUMPS: lambda s: self.fwjumps,
+            StatType.BACKJUMPS: lambda s: self.backjumps,
+            StatType.BADJUMPS: lambda s: self.badjumps,
+            StatType.FREQUENT: lambda s: self.frequent,
+        }
+
+    def print_stats(self, stats: list[Stat], out: TextIO) -> None:
+        # the values are collected while the instructions pass through
+        # `count` or `examine`, they are not valid before that is finished
+        if not self.counted:
+            raise RuntimeError("The instructions were not counted")
+        if not self.examined and needs_examine(stats):
+            raise RuntimeError("The instructions were not examined")
+
+        dispatch = self._dispatch
+        out.writelines(dispatch[s.type](s) for s in stats)
+
+    def count(self, insts: Iterable[Instruction]) -> Iterator[Instruction]:
+        """
+        Yields the instructions from `insts` and only counts them. This is
+        enough for the stats that don't need `examine`. The count is stored
+        when `insts` is exhausted.
+        """
 
-    def print_stats(self, stats: list[Stat], out: TextIO):
-        for s in stats:
-            out.write(self._get_value(s))
-
-    def _get_value(self, stat: Stat) -> str:
-        match stat.type:
-            case StatType.LOC:
-                return self.loc
-            case StatType.COMMENTS:
-                return self.comments
-            case StatType.PRINT:
-                return stat.value + "\n"
-            case StatType.EOL:
-                return "\n"
-            case _:
-                # calculate the stats lazily only once
-                if not self.examined:
-                    self._examine()
-                match stat.type:
-                    case StatType.LABELS:
-                        return self.labels
-                    case StatType.JUMPS:
-                        return self.jumps
-                    case StatType.FWJUMPS:
-                        return self.fwjumps
-                    case StatType.BACKJUMPS:
-                        return self.backjumps
-                    case StatType.BADJUMPS:
-                        return self.badjumps
-                    case StatType.FREQUENT:
-                        return self.frequent
-
-    def _examine(self):
+        loc = 0
+        for inst in insts:
+            yield inst
+            loc += 1
+
+        self.loc = str(loc) + "\n"
+        self.comments = str(self.lexer.comment_count) + "\n"
+        self.counted = True
+
+    def examine(self, insts: Iterable[Instruction]) -> Iterator[Instruction]:
+        """
+        Yields the instructions from `insts` and collects the stats from them
+        on the way, so that there is no other pass over the instructions. The
+        stats are stored when `insts` is exhausted.
+        """
+
+        loc = 0
         labels = 0
         jumps = 0
         fwjumps = 0
         backjumps = 0
-        badjumps = 0
-        frequent = 0
 
         # info about usages of labels:
-        #   None       - this is the first sight of the label
+        #   missing    - this is the first sight of the label
         #   positive n - the label has been jumped to n times, but haven't been
         #                defined yet (jump forward / bad jump)
         #   -1         - label has been already defined (jump backwards)
@@ -94,61 +147,78 @@ class Stats:
         # histogram of opcodes
         freqs: dict[str, int] = {}
 
-        for inst in self.insts:
-            # add the opcode to histogram
-            if inst.opcode in freqs:
-                freqs[inst.opcode] += 1
+        # bound methods and globals used in the loop are cached in locals
+        cat_get = _CAT.get
+        cnts_get = jump_cnts.get
+        cat_label = _CAT_LABEL
+        cat_jump = _CAT_JUMP
+
+        for inst in insts:
+            yield inst
+
+            loc += 1
+            op = inst.opcode
+            # add the opcode to histogram, almost all opcodes are already
+            # there so the exception is rare and it is cheaper than checking
+            # for the key each time. Plain dict is used instead of `Counter`
+            # because indexing of dict subclass is slower.
+            try:
+                freqs[op] += 1
+            except KeyError:
+                freqs[op] = 1
+
+            # the category is single dict lookup instead of comparing the
+            # opcode with each of the names
+            cat = cat_get(op)
+            if cat is None:
+                continue
+
+            # definition of label found, all encouters of that label so far
+            # are jumps forward
+            if cat == cat_label:
+                labels += 1
+                name = inst.args[0].value
+                cnt = cnts_get(name, 0)
+                if cnt > 0:
+                    fwjumps += cnt
+                jump_cnts[name] = -1
+            # jump where we can determine the direction of it
+            elif cat == cat_jump:
+                jumps += 1
+                name = inst.args[0].value
+                cnt = cnts_get(name, 0)
+                # label has already been encountered - jump backward
+                if cnt == -1:
+                    backjumps += 1
+                # first or another encounter - jump forward / bad jump
+                else:
+                    jump_cnts[name] = cnt + 1
+            # return is also jump, but the direction is not defined
             else:
-                freqs[inst.opcode] = 1
-
-            match inst.opcode:
-                # definition of label found, all encouters of that label so far
-                # are jumps forward
-                case "LABEL":
-                    labels += 1
-                    name = inst.args[0].value
-                    cnt = jump_cnts.get(name)
-                    if cnt is not None and cnt > 0:
-                        fwjumps += cnt
-                    jump_cnts[name] = -1
-                # jump where we can determine the direction of it
-                case "CALL" | "JUMP" | "JUMPIFEQ" | "JUMPIFNEQ":
-                    jumps += 1
-                    name = inst.args[0].value
-                    cnt = jump_cnts.get(name)
-                    # first encounter - jump forward / bad jump
-                    if cnt is None:
-                        jump_cnts[name] = 1
-                    # label has already been encountered - jump backward
-                    elif cnt == -1:
-                        backjumps += 1
-                    # jump forward / bad jumps
-                    else:
-                        jump_cnts[name] = cnt + 1
-                # return is also jump, but the direction is not defined
-                case "RETURN":
-                    jumps += 1
-                case _:
-                    pass
+                jumps += 1
         # end of iteration of instructions
 
         # all jumps to nonexisting labels are bad jumps
-        for c in jump_cnts.values():
-            if c > 0:
-                badjumps += c
+        badjumps = sum(c for c in jump_cnts.values() if c > 0)
+
+        # comments were counted by the lexer, it has already read the whole
+        # input
+        comments = self.lexer.comment_count
 
-        # order the instruction opcodes based on their frequency
-        frequent = ",".join(map(
-            lambda i: i[0],
-            sorted(freqs.items(), key = lambda i: i[1], reverse = True)
-        ))
+        # order the instruction opcodes based on their frequency, the sort is
+        # stable so opcodes with the same count stay in order of appearance.
+        # The bound `__getitem__` is used as key so that no lambda is called.
+        frequent = ",".join(sorted(freqs, key = freqs.__getitem__, reverse = True))
 
         # store the data
+        self.loc = str(loc) + "\n"
+        self.comments = str(comments) + "\n"
         self.labels = str(labels) + "\n"
         self.jumps = str(jumps) + "\n"
         self.fwjumps = str(fwjumps) + "\n"
         self.backjumps = str(backjumps) + "\n"
         self.badjumps = str(badjumps) + "\n"
         self.frequent = frequent + "\n"
-        # data is now loaded, don't load it again
+        # data is now loaded
+        self.counted = True
         self.examined = True